@@ -1,72 +1,165 @@
 """Spotify Voice Assistant Search Integration for Home Assistant."""
+import asyncio
 import logging
 import re
+from operator import attrgetter
 import voluptuous as vol
-from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.core import Event, HomeAssistant, ServiceCall, callback
 import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_track_state_change_event
 from homeassistant.helpers.typing import ConfigType
+from rapidfuzz import fuzz, process
 
 _LOGGER = logging.getLogger(__name__)
 
 DOMAIN = "spotify_voice_assistant"
-VALID_SEARCH_TYPES = {"artist", "album", "track", "playlist"}
+VALID_SEARCH_TYPES = frozenset({"artist", "album", "track", "playlist"})
+_INVALID_TYPE_MESSAGE = (
+    f"Invalid type. Must be one of: {', '.join(sorted(VALID_SEARCH_TYPES))}")
+# Seconds before the cached user playlists are refetched from Spotify
+USER_PLAYLISTS_CACHE_TTL = 300
+# Seconds a search result is reused for repeated identical queries
+RESULT_CACHE_TTL = 60
+RESULT_CACHE_MAX_SIZE = 100
+# Minimum rapidfuzz score (0-100) for a fuzzy user playlist match
+FUZZY_MATCH_SCORE_CUTOFF = 85
 
 CONFIG_SCHEMA = cv.empty_config_schema(DOMAIN)
 
-# Cache Spotify client to avoid repeated lookups
-_spotify_cache = {
-    "client": None,
-    "entity_id": None,
-    "user_playlists": None,
+# Leading command words stripped from queries, per search type
+_FILLER_PATTERNS = {
+    "artist": re.compile(r"^(?:play\s+)?(?:(?:artist|group|band)\s+)?"),
+    "album": re.compile(r"^(?:play\s+)?(?:album\s+)?"),
+    "track": re.compile(r"^(?:play\s+)?(?:(?:song|track)\s+)?"),
+    "playlist": re.compile(r"^(?:play\s+)?"),
 }
+# "playlist"/"playlists" as a whole word, removed from playlist queries
+_PLAYLIST_WORD = re.compile(r"\bplaylists?\b")
+_WHITESPACE = re.compile(r"\s+")
+# Result list getters for each search type, e.g. "artist" -> results.artists
+_GET_ITEMS = {t: attrgetter(t + "s") for t in VALID_SEARCH_TYPES}
+
+
+class _Cache:
+    """Cached Spotify client, user playlists and recent search results."""
+
+    __slots__ = ("client", "entity_id", "user_playlists", "user_playlists_expires",
+                 "remove_listener", "results", "generation")
+
+    def __init__(self) -> None:
+        self.client = None
+        self.entity_id = None
+        self.user_playlists = None
+        # Loop time after which user_playlists is refetched
+        self.user_playlists_expires = 0.0
+        self.remove_listener = None
+        # Recent search results keyed by (search_type, cleaned query)
+        self.results = {}
+        # Bumped on every reset so fetches started before it don't write back
+        self.generation = 0
+
+    def is_empty(self) -> bool:
+        """Return True when nothing is cached."""
+        return (self.client is None and self.entity_id is None
+                and self.user_playlists is None and not self.results)
+
+    def reset(self) -> None:
+        """Drop all cached data and stop tracking the cached Spotify entity."""
+        if self.remove_listener is not None:
+            self.remove_listener()
+        self.client = self.entity_id = self.user_playlists = self.remove_listener = None
+        self.user_playlists_expires = 0.0
+        self.results.clear()
+        self.generation += 1
 
 
 def clean_query(query: str, search_type: str) -> str:
     """Remove common command words to improve search accuracy."""
     query = query.lower().strip()
 
-    # Remove "play" from the start of any query
-    if query.startswith("play "):
-        query = query[5:]
+    # Remove "play" and type-specific filler words from the start of the query
+    query = _FILLER_PATTERNS[search_type].sub("", query, count=1)
 
-    # Remove type-specific filler words
-    if search_type == "artist":
-        # Remove "artist" prefix if LLM included it
-        query = query.replace("artist ", "").replace(
-            "group ", "").replace("band ", "")
-    elif search_type == "album":
-        # Remove "album" prefix
-        query = query.replace("album ", "")
-    elif search_type == "track":
-        # Remove "song" or "track" prefix
-        query = query.replace("song ", "").replace("track ", "")
+    return _WHITESPACE.sub(" ", query).strip()
 
-    return " ".join(query.split()).strip()
+
+def _lowered_names(items) -> list:
+    """Return (lowercased name, item) pairs for the items that have a name."""
+    return [(name.lower(), item)
+            for item in items if (name := getattr(item, "name", None))]
+
+
+def _pick_result(items, query_lower: str, kind: str, partial: bool = False):
+    """Build the response for the exact name match, or the first result.
+
+    With partial=True, a result whose name contains the query is preferred
+    over the first result. Returns the response and the match type, which
+    is None when the selected item is missing its URI or name.
+    """
+    candidates = _lowered_names(items)
+    selected = next(
+        (item for name_lower, item in candidates if name_lower == query_lower), None)
+    match_type = "exact match"
+    if selected is None and partial:
+        selected = next(
+            (item for name_lower, item in candidates if query_lower in name_lower), None)
+        match_type = "partial match"
+    if selected is None:
+        selected = items[0]
+        match_type = "first result"
+
+    uri = getattr(selected, "uri", None)
+    name = getattr(selected, "name", None)
+    if uri is None or name is None:
+        return {"error": f"Invalid {kind} data from Spotify"}, None
+
+    return {"uri": uri, "name": name, "type": kind}, match_type
+
+
+def _index_playlists(items) -> dict:
+    """Precompute lowercased playlist names for exact, partial and fuzzy matching."""
+    lower_names = _lowered_names(items)
+    by_lower_name = {}
+    for name_lower, item in lower_names:
+        by_lower_name.setdefault(name_lower, item)
+    return {
+        "items": items,
+        "by_lower_name": by_lower_name,
+        "lower_names": lower_names,
+        # Same order as lower_names, as plain strings for rapidfuzz
+        "names": [name_lower for name_lower, _ in lower_names],
+    }
 
 
 async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
     """Set up the Spotify Voice Assistant Search component."""
+    # Cache Spotify client to avoid repeated lookups
+    cache = hass.data.setdefault(DOMAIN, _Cache())
+    result_cache = cache.results
+    playlists_lock = asyncio.Lock()
+
+    @callback
+    def invalidate_cache(event: Event) -> None:
+        """Invalidate the cache when the cached Spotify entity is removed."""
+        if event.data["new_state"] is not None:
+            return
+        _LOGGER.info(
+            "Cached Spotify entity no longer exists, invalidating cache")
+        cache.reset()
 
     async def get_spotify_client():
-        """Get Spotify client with caching and validation."""
-        if _spotify_cache["client"] is not None:
-            if _spotify_cache["entity_id"] in hass.states.async_entity_ids():
-                _LOGGER.debug("Using cached Spotify client")
-                return _spotify_cache["client"]
-            else:
-                _LOGGER.info(
-                    "Cached Spotify entity no longer exists, invalidating cache")
-                _spotify_cache["client"] = None
-                _spotify_cache["entity_id"] = None
-                _spotify_cache["user_playlists"] = None
+        """Get Spotify client with caching and event-driven invalidation."""
+        if cache.client is not None:
+            _LOGGER.debug("Using cached Spotify client")
+            return cache.client
 
         _LOGGER.debug("Cache miss, performing Spotify entity lookup")
 
-        spotify_entity_id = None
-        for state in hass.states.async_all("media_player"):
-            if "spotify" in state.entity_id.lower():
-                spotify_entity_id = state.entity_id
-                break
+        spotify_entity_id = next(
+            (entity_id for entity_id in hass.states.async_entity_ids("media_player")
+             if entity_id.startswith("media_player.spotify")),
+            None,
+        )
 
         if not spotify_entity_id:
             _LOGGER.error("No Spotify media player entity found")
@@ -77,31 +170,29 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
         if not entity_component:
             raise LookupError("Media player component not available")
 
-        spotify_entity = None
-        for entity in entity_component.entities:
-            if entity.entity_id == spotify_entity_id:
-                spotify_entity = entity
-                break
-
+        spotify_entity = entity_component.get_entity(spotify_entity_id)
         if not spotify_entity:
             raise LookupError("Spotify entity not available")
 
-        if not hasattr(spotify_entity, "coordinator"):
-            raise AttributeError("Spotify coordinator not available")
-
-        coordinator = spotify_entity.coordinator
-        if not hasattr(coordinator, "client"):
-            raise AttributeError("Spotify client not available")
-
-        client = coordinator.client
-        _spotify_cache["client"] = client
-        _spotify_cache["entity_id"] = spotify_entity_id
+        try:
+            client = spotify_entity.coordinator.client
+        except AttributeError as err:
+            raise LookupError("Spotify client not available") from err
+
+        cache.client = client
+        cache.entity_id = spotify_entity_id
+        cache.remove_listener = async_track_state_change_event(
+            hass, [spotify_entity_id], invalidate_cache)
         _LOGGER.info("Cached Spotify client for entity: %s", spotify_entity_id)
 
         return client
 
     async def search_spotify(call: ServiceCall):
-        """Search Spotify and return the first result's URI."""
+        """Search Spotify and return the first result's URI.
+
+        When a list of types is given, each type is searched concurrently
+        and the results are returned keyed by type.
+        """
         raw_query = call.data.get("query")
         search_type = call.data.get("type", "artist")
 
@@ -109,160 +200,217 @@ async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
             _LOGGER.error("No query provided to spotify_voice_assistant")
             return {"error": "No query provided"}
 
-        if search_type not in VALID_SEARCH_TYPES:
-            return {"error": f"Invalid type. Must be one of: {', '.join(VALID_SEARCH_TYPES)}"}
+        if isinstance(search_type, str):
+            search_types = [search_type]
+        elif isinstance(search_type, list):
+            search_types = list(dict.fromkeys(search_type))
+        else:
+            search_types = []
+
+        if not search_types or any(
+                not isinstance(t, str) or t not in VALID_SEARCH_TYPES for t in search_types):
+            return {"error": _INVALID_TYPE_MESSAGE}
 
+        if isinstance(search_type, str):
+            return await search_type_cached(raw_query, search_type)
+
+        results = await asyncio.gather(
+            *(search_type_cached(raw_query, t) for t in search_types))
+        return dict(zip(search_types, results))
+
+    async def search_type_cached(raw_query: str, search_type: str):
+        """Search a single type, reusing a recent result when available."""
         # --- UPDATE: Clean the query before sending to Spotify ---
         query = clean_query(raw_query, search_type)
         _LOGGER.info("Searching Spotify (%s) for cleaned query: '%s' (raw: '%s')",
                      search_type, query, raw_query)
 
+        cache_key = (search_type, query)
+        cached = result_cache.get(cache_key)
+        if cached is not None and hass.loop.time() - cached[0] < RESULT_CACHE_TTL:
+            _LOGGER.debug("Using cached search result for '%s'", query)
+            return dict(cached[1])
+
         try:
             client = await get_spotify_client()
-        except (LookupError, AttributeError) as err:
+        except LookupError as err:
             _LOGGER.error("Failed to get Spotify client: %s", err)
             return {"error": str(err)}
 
-        try:
-            if search_type == "artist":
-                results = await client.search(query, ["artist"], limit=10)
-                items_list = results.artists
-                if items_list and len(items_list) > 0:
-                    exact_match = None
-                    query_lower = query.lower()
-                    for artist in items_list:
-                        if hasattr(artist, "name") and artist.name.lower() == query_lower:
-                            exact_match = artist
-                            break
-
-                    selected_artist = exact_match if exact_match else items_list[0]
-
-                    if not hasattr(selected_artist, "uri"):
-                        return {"error": "Invalid artist data from Spotify"}
-
-                    uri = selected_artist.uri
-                    name = selected_artist.name
-                    match_type = "exact match" if exact_match else "first result"
-                    result = {"uri": uri, "name": name, "type": "artist"}
-                    _LOGGER.info("✅ SEARCH RESULT (%s): %s",
-                                 match_type, result)
-                    return result
-                else:
-                    error_result = {"error": f"No artist found for: {query}"}
-                    _LOGGER.error("❌ SEARCH ERROR: %s", error_result)
-                    return error_result
-
-            elif search_type == "playlist":
-                # Cleaning is already handled by clean_query logic above,
-                # but we keep the specific 'playlist' word removal for safety
-                query_cleaned = query.lower().replace(
-                    "playlist", "").replace("playlists", "").strip()
-
-                # 1. Search User Library
-                try:
-                    if _spotify_cache["user_playlists"] is None:
-                        user_playlists_response = await client.get_playlists_for_current_user()
-                        if user_playlists_response and hasattr(user_playlists_response, "items"):
-                            _spotify_cache["user_playlists"] = user_playlists_response.items
-                        else:
-                            _spotify_cache["user_playlists"] = []
-
-                    user_playlists = _spotify_cache["user_playlists"]
-
-                    # Exact match in library
-                    for playlist in user_playlists:
-                        if hasattr(playlist, "name") and playlist.name.lower() == query_cleaned:
-                            result = {"uri": playlist.uri,
-                                      "name": playlist.name, "type": "playlist"}
-                            _LOGGER.info(
-                                "✅ SEARCH RESULT (user library - exact match): %s", result)
-                            return result
-
-                    # Partial match in library
-                    for playlist in user_playlists:
-                        if hasattr(playlist, "name") and query_cleaned in playlist.name.lower():
-                            result = {"uri": playlist.uri,
-                                      "name": playlist.name, "type": "playlist"}
-                            _LOGGER.info(
-                                "✅ SEARCH RESULT (user library - partial match): %s", result)
-                            return result
-
-                except Exception as err:
-                    _LOGGER.warning("Error searching user playlists: %s", err)
-
-                # 2. Fallback to Public Search
-                results = await client.search(query_cleaned, ["playlist"], limit=10)
-                items_list = results.playlists
-                if items_list and len(items_list) > 0:
-                    selected_playlist = items_list[0]
-                    result = {"uri": selected_playlist.uri,
-                              "name": selected_playlist.name, "type": "playlist"}
-                    _LOGGER.info(
-                        "✅ SEARCH RESULT (public playlist - first result): %s", result)
-                    return result
-                else:
-                    error_result = {"error": f"No playlist found for: {query}"}
-                    _LOGGER.error("❌ SEARCH ERROR: %s", error_result)
-                    return error_result
-
-            else:
-                # Handle Album and Track
-                results = await client.search(query, [search_type], limit=10)
-                items_list = getattr(results, f"{search_type}s", None)
-
-                if items_list and len(items_list) > 0:
-                    exact_match = None
-                    query_lower = query.lower()
-                    for item in items_list:
-                        if hasattr(item, "name") and item.name.lower() == query_lower:
-                            exact_match = item
-                            break
-
-                    # Fallback logic for Albums
-                    if not exact_match and search_type == "album" and len(query.split()) >= 2:
+        generation = cache.generation
+        result = await run_search(client, query, search_type)
+        if "error" not in result and cache.generation == generation:
+            result_cache.pop(cache_key, None)
+            if len(result_cache) >= RESULT_CACHE_MAX_SIZE:
+                del result_cache[next(iter(result_cache))]
+            result_cache[cache_key] = (hass.loop.time(), dict(result))
+        return result
+
+    def cached_user_playlists():
+        """Return the cached user playlists, or None when stale."""
+        if cache.user_playlists is None or hass.loop.time() > cache.user_playlists_expires:
+            return None
+        return cache.user_playlists
+
+    async def get_user_playlists(client):
+        """Get the user's indexed playlists, fetching them when stale."""
+        if (cached := cached_user_playlists()) is not None:
+            return cached
+
+        # Only one search fetches the playlists; concurrent searches wait
+        # for it and then read the freshly cached list.
+        async with playlists_lock:
+            if (cached := cached_user_playlists()) is not None:
+                return cached
+
+            generation = cache.generation
+            user_playlists_response = await client.get_playlists_for_current_user()
+            user_playlists = _index_playlists(
+                getattr(user_playlists_response, "items", None) or [])
+            # Skip the write if the cache was reset while fetching
+            if cache.generation == generation:
+                cache.user_playlists = user_playlists
+                cache.user_playlists_expires = hass.loop.time() + USER_PLAYLISTS_CACHE_TTL
+            return user_playlists
+
+    async def search_direct(client, query: str, search_type: str):
+        """Search artists, albums or tracks, preferring an exact name match."""
+        results = await client.search(query, [search_type], limit=10)
+        items_list = _GET_ITEMS[search_type](results)
+        if not items_list:
+            error_result = {"error": f"No {search_type} found for: {query}"}
+            _LOGGER.error("❌ SEARCH ERROR: %s", error_result)
+            return error_result
+
+        # Albums already returned are checked for a partial match before
+        # spending another round-trip on the track fallback
+        is_album = search_type == "album"
+        result, match_type = _pick_result(
+            items_list, query, search_type, partial=is_album)
+
+        # Fallback logic for Albums
+        if (is_album and match_type not in ("exact match", "partial match")
+                and len(query.split()) >= 2):
+            _LOGGER.info(
+                "No exact or partial album match for '%s', trying track search", query)
+            try:
+                track_results = await client.search(query, ["track"], limit=1)
+                track_items = _GET_ITEMS["track"](track_results)
+                if track_items and len(track_items) > 0:
+                    first_track = track_items[0]
+                    result = {"uri": first_track.uri,
+                              "name": first_track.name, "type": "track"}
+                    if _LOGGER.isEnabledFor(logging.INFO):
                         _LOGGER.info(
-                            "No exact album match for '%s', trying track search", query)
-                        try:
-                            track_results = await client.search(query, ["track"], limit=10)
-                            track_items = getattr(
-                                track_results, "tracks", None)
-                            if track_items and len(track_items) > 0:
-                                first_track = track_items[0]
-                                result = {"uri": first_track.uri,
-                                          "name": first_track.name, "type": "track"}
-                                _LOGGER.info(
-                                    "✅ SEARCH RESULT (album→track fallback): %s", result)
-                                return result
-                        except Exception:
-                            pass
-
-                    selected_item = exact_match if exact_match else items_list[0]
-                    match_type = "exact match" if exact_match else "first result"
-                    result = {"uri": selected_item.uri,
-                              "name": selected_item.name, "type": search_type}
-                    _LOGGER.info("✅ SEARCH RESULT (%s - %s): %s",
-                                 search_type, match_type, result)
+                            "✅ SEARCH RESULT (album→track fallback): %s", result)
                     return result
-                else:
-                    error_result = {
-                        "error": f"No {search_type} found for: {query}"}
-                    _LOGGER.error("❌ SEARCH ERROR: %s", error_result)
-                    return error_result
+            except Exception:
+                pass
+
+        if match_type and _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info("✅ SEARCH RESULT (%s - %s): %s",
+                         search_type, match_type, result)
+        return result
+
+    async def search_playlist(client, query: str, search_type: str):
+        """Search the user's playlists first, then public playlists."""
+        # Cleaning is already handled by clean_query logic above,
+        # but we keep the specific 'playlist' word removal for safety
+        query_cleaned = _WHITESPACE.sub(
+            " ", _PLAYLIST_WORD.sub("", query)).strip()
+
+        # A cold library cache costs a round-trip of its own, so start the
+        # public search alongside it instead of after a library miss
+        public_search = None
+        if cached_user_playlists() is None:
+            public_search = asyncio.create_task(
+                client.search(query_cleaned, ["playlist"], limit=10))
+
+        # 1. Search User Library
+        try:
+            user_playlists = await get_user_playlists(client)
+
+            # Exact match wins; otherwise use the first partial match
+            exact_match = user_playlists["by_lower_name"].get(query_cleaned)
+            partial_match = None
+            if exact_match is None:
+                partial_match = next(
+                    (playlist for name_lower, playlist in user_playlists["lower_names"]
+                     if query_cleaned in name_lower),
+                    None,
+                )
+
+            fuzzy_match = None
+            if exact_match is None and partial_match is None:
+                # Catch near-misses such as "chil vybes" locally before
+                # falling back to a public search
+                match = process.extractOne(
+                    query_cleaned, user_playlists["names"],
+                    scorer=fuzz.ratio, score_cutoff=FUZZY_MATCH_SCORE_CUTOFF)
+                if match is not None:
+                    fuzzy_match = user_playlists["lower_names"][match[2]][1]
+
+            selected_playlist = exact_match or partial_match or fuzzy_match
+            if selected_playlist:
+                result = {"uri": selected_playlist.uri,
+                          "name": selected_playlist.name, "type": "playlist"}
+                if _LOGGER.isEnabledFor(logging.INFO):
+                    if exact_match:
+                        match_type = "exact match"
+                    elif partial_match:
+                        match_type = "partial match"
+                    else:
+                        match_type = "fuzzy match"
+                    _LOGGER.info(
+                        "✅ SEARCH RESULT (user library - %s): %s", match_type, result)
+                if public_search is not None and not public_search.cancel():
+                    # Already finished; retrieve any error so it isn't reported
+                    public_search.exception()
+                return result
 
         except Exception as err:
+            _LOGGER.warning("Error searching user playlists: %s", err)
+
+        # 2. Fallback to Public Search
+        if public_search is not None:
+            results = await public_search
+        else:
+            results = await client.search(query_cleaned, ["playlist"], limit=10)
+        items_list = _GET_ITEMS["playlist"](results)
+        if not items_list:
+            error_result = {"error": f"No playlist found for: {query}"}
+            _LOGGER.error("❌ SEARCH ERROR: %s", error_result)
+            return error_result
+
+        result, match_type = _pick_result(items_list, query_cleaned, "playlist")
+        if match_type and _LOGGER.isEnabledFor(logging.INFO):
+            _LOGGER.info(
+                "✅ SEARCH RESULT (public playlist - %s): %s", match_type, result)
+        return result
+
+    search_handlers = {
+        "artist": search_direct,
+        "album": search_direct,
+        "track": search_direct,
+        "playlist": search_playlist,
+    }
+
+    async def run_search(client, query: str, search_type: str):
+        """Run the Spotify search for a query already lowercased by clean_query."""
+        try:
+            return await search_handlers[search_type](client, query, search_type)
+        except Exception:
             _LOGGER.exception("Unexpected error searching Spotify")
             return {"error": "Search failed"}
 
     async def clear_cache(call: ServiceCall):
-        """Clear Spotify client and user playlists cache."""
-        if _spotify_cache["client"] is not None or _spotify_cache["user_playlists"] is not None:
-            _spotify_cache["client"] = None
-            _spotify_cache["entity_id"] = None
-            _spotify_cache["user_playlists"] = None
-            return {"success": True, "message": "Cache cleared"}
-        else:
+        """Clear Spotify client, user playlists and search result cache."""
+        if cache.is_empty():
             return {"success": False, "message": "Cache was already empty"}
 
+        cache.reset()
+        return {"success": True, "message": "Cache cleared"}
+
     hass.services.async_register(
         DOMAIN, "search", search_spotify, supports_response="only"
     )